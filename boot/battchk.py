@@ -23,6 +23,11 @@ except ImportError:
     warnings.warn("buttonman was not imported, so no processes can be registered. This means the process can't be stopped by buttonman.",  # noqa: E501
                   ImportWarning, stacklevel=2)
 
+try:
+    from hiwonder_common.beeper import BeepScheduler
+except ImportError:
+    BeepScheduler = None
+
 sys.stdout.reconfigure(encoding="utf-8")
 
 
@@ -86,6 +91,10 @@ def all_leds(r, g, b):
     s.show()
 
 
+# plays beeps on its own thread so stop() can cut one short; ledbeepfor() is the fallback
+beeper = BeepScheduler(buzzer, lambda rgbv: all_leds(*rgbv)) if BeepScheduler else None
+
+
 def ledbeepfor(rgbv, dton, dtoff=0.0):
     if __stop:
         return
@@ -160,11 +169,15 @@ def decimal_split(x: float, precision=1, mode='digit'):
 
 
 def beepn(n, color):
-    if n == 0:
-        ledbeepfor(color, .09, .2)
+    pattern = [(.09, .2, color)] if n == 0 else [(.3, .2, color)] * n
+    if beeper is None:
+        for dton, dtoff, _ in pattern:
+            ledbeepfor(color, dton, dtoff)
         return
-    for _ in range(n):
-        ledbeepfor(color, .3, .2)
+    if __stop:
+        return
+    beeper.play(pattern)
+    beeper.wait()  # digits are read out one after the other
 
 
 def measure_voltage(n: int = 1):
@@ -193,6 +206,8 @@ def loop():
 def stop():
     global __stop
     __stop = True
+    if beeper:
+        beeper.cancel()
     buzzer(0)
     all_leds(*rgb['black'])
     print("battchk.py will stop soon.")
@@ -18,6 +18,10 @@ try:
     import statemachine
 except ImportError:
     statemachine = None
+try:
+    from hiwonder_common.beeper import BeepScheduler
+except ImportError:  # this also runs on boot without hiwonder_common installed
+    BeepScheduler = None
 
 import RPi.GPIO as GPIO
 
@@ -50,6 +54,10 @@ KUP = GPIO.HIGH
 LED1_PIN = 16
 LED2_PIN = 26
 
+# (on, off) seconds per beep
+AP_BEEP = ((.1, .1), (.1, .1), (.1, .12), (.3, .2))
+AP_OFF_BEEP = ((.3, .08), (.08, .06), (.1, .13), (.08, .2))
+
 
 def stop_board():
     try:
@@ -461,6 +469,7 @@ class ActionMachine(statemachine.StateMachine):
 
 class ButtonManager:
     beeps = True
+    beeper = None  # BeepScheduler, made on first play()
 
     def __init__(self) -> None:
 
@@ -501,6 +510,17 @@ class ButtonManager:
         cls.buzzer(0)
         time.sleep(dtoff)
 
+    @classmethod
+    def play(cls, pattern):
+        # plays (on, off) beeps in the background if hiwonder_common is available, otherwise blocks
+        if BeepScheduler is None:
+            for step in pattern:
+                cls.buzzfor(*step)
+            return
+        if cls.beeper is None:
+            cls.beeper = BeepScheduler(cls.buzzer)
+        cls.beeper.play(pattern)
+
     def btn_event(self, channel, state):
         t = time.time_ns()
         while not self.lock.acquire_lock():  # SPINLOCK BRR
@@ -608,17 +628,11 @@ class ButtonManager:
 
     @classmethod
     def ap_beep(cls):
-        cls.buzzfor(.1, .1)
-        cls.buzzfor(.1, .1)
-        cls.buzzfor(.1, .12)
-        cls.buzzfor(.3, .2)
+        cls.play(AP_BEEP)
 
     @classmethod
     def ap_off_beep(cls):
-        cls.buzzfor(.3, .08)
-        cls.buzzfor(.08, .06)
-        cls.buzzfor(.1, .13)
-        cls.buzzfor(.08, .2)
+        cls.play(AP_OFF_BEEP)
 
 
 if __name__ == "__main__":
@@ -4,7 +4,6 @@
 
 # pyright: reportImplicitOverride=false
 
-import time
 import argparse
 import numpy as np
 
@@ -29,7 +28,6 @@ class ConstantSpeedProgram(program.Program):
         self.moves_this_frame = []
         _avg_fps = self.fps_averager(self.fps)  # feed the averager
         self.control_wrapper()
-        time.sleep(1e-3)
 
 
 def get_parser(parser: argparse.ArgumentParser, subparsers=None):
@@ -37,6 +35,7 @@ def get_parser(parser: argparse.ArgumentParser, subparsers=None):
     parser.add_argument("-d", "--direction_vector", type=float, default=90)
     parser.add_argument("-w", "--turning_rate", type=float, default=0)
     parser.add_argument("--enable_logging", action="store_true")
+    parser.set_defaults(rate=100)  # no need to resend a constant speed any faster than this
     return parser, subparsers
 
 
@@ -0,0 +1,82 @@
+# play beep and LED flash patterns on a background thread
+
+import threading
+from collections import deque
+
+BLACK = (0, 0, 0)
+
+
+class BeepScheduler:
+    """
+    Plays beep patterns on its own thread so callers don't sleep through them.
+
+    A pattern is a sequence of steps, each (on_seconds, off_seconds) or
+    (on_seconds, off_seconds, (r, g, b)). A step turns the buzzer on, and if it has a color
+    and leds was given, sets the LEDs to it; after on_seconds it turns both off and waits
+    off_seconds before the next step. play() queues a pattern and returns immediately;
+    patterns play one after another. cancel() stops whatever is playing right away,
+    leaves the buzzer off, and drops anything still queued.
+
+    buzzer(value) and leds((r, g, b)) write the hardware. They're only called from this thread.
+    """
+
+    def __init__(self, buzzer, leds=None):
+        self.buzzer = buzzer
+        self.leds = leds
+        self._cond = threading.Condition()
+        self._steps = deque()
+        self._playing = False
+        self._cancels = 0  # bumped by cancel() to interrupt the step being played
+        self.thread = None
+
+    def play(self, pattern):
+        with self._cond:
+            self._steps.extend(pattern)
+            if self.thread is None:  # started on first use so unused schedulers cost nothing
+                self.thread = threading.Thread(target=self.loop, daemon=True)
+                self.thread.start()
+            self._cond.notify_all()
+
+    def cancel(self, timeout=0.5):
+        # waits (up to timeout) for the buzzer to actually be turned off, so it's safe to exit right after
+        with self._cond:
+            self._steps.clear()
+            self._cancels += 1
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._playing, timeout)
+
+    @property
+    def idle(self):
+        return not self._steps and not self._playing
+
+    def wait(self, timeout=None):
+        # block until everything queued has played (or been cancelled). Returns False on timeout
+        with self._cond:
+            return self._cond.wait_for(lambda: self.idle, timeout)
+
+    def loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._steps)
+                step = self._steps.popleft()
+                self._playing = True
+                cancels = self._cancels
+            on, off, *color = step
+            color = color[0] if color and self.leds else None
+            self.buzzer(1)
+            if color:
+                self.leds(color)
+            cancelled = self._sleep(on, cancels)
+            self.buzzer(0)
+            if color:
+                self.leds(BLACK)
+            if not cancelled:
+                self._sleep(off, cancels)
+            with self._cond:
+                self._playing = False
+                self._cond.notify_all()
+
+    def _sleep(self, seconds, cancels):
+        # returns True if cancel() was called before seconds passed
+        with self._cond:
+            return self._cond.wait_for(lambda: self._cancels != cancels, seconds)
@@ -0,0 +1,202 @@
+# per-stage timing of the CameraBinaryProgram vision pipeline, runnable off the robot
+
+import sys
+import json
+import time
+import pathlib
+import argparse
+import platform
+import itertools
+from collections import defaultdict
+import numpy as np
+import cv2
+
+from hiwonder_common.vision import DetectionPipeline
+from hiwonder_common.capture import SyntheticSource, open_source
+from hiwonder_common.lab_config import load_config
+from hiwonder_common.preview import PreviewWorker, draw_fitted_rect, draw_text, draw_fps
+import hiwonder_common.env_tools as envt
+
+
+DEFAULT_THRESHOLD = ((0, 0, 0), (255, 110, 255))  # roughly "green" in LAB; matches SyntheticSource's default color
+
+
+class Stopwatch:
+    """
+    Collects per-stage times for each frame.
+
+    Call start() at the top of a frame, lap(stage) after each stage, and end() after the last one.
+    Laps with the same name in one frame are added together.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)  # stage -> [ns, ...], one entry per frame the stage ran in
+        self._frame = {}
+        self._t = 0
+
+    def start(self):
+        self._frame = {}
+        self._t = time.perf_counter_ns()
+
+    def lap(self, stage):
+        t = time.perf_counter_ns()
+        self._frame[stage] = self._frame.get(stage, 0) + t - self._t
+        self._t = t
+
+    def end(self):
+        for stage, ns in self._frame.items():
+            self.samples[stage].append(ns)
+        self.samples['total'].append(sum(self._frame.values()))
+
+    def summary(self):
+        d = {}
+        for stage, ns in self.samples.items():
+            ms = np.array(ns) / 1e6
+            d[stage] = {
+                'median_ms': float(np.median(ms)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'mean_ms': float(ms.mean()),
+                'n': len(ms),
+            }
+        return d
+
+
+class _NullSink:
+    active = True
+
+    def send(self, img):
+        pass
+
+    def close(self):
+        pass
+
+
+def _render(img, contour):
+    # same drawing as CameraBinaryProgram.annotate()
+    if contour is not None:
+        draw_fitted_rect(img, contour, (0, 255, 0))
+    draw_text(img, (0, 0, 0), 'green' if contour is not None else 'None')
+    draw_fps(img, (0, 0, 0), 30.0)
+
+
+def run(pipeline, frames, threshold, min_area=300, preview_size=(640, 480), annotate=True, warmup=5):
+    # Time every stage of main_loop's detection and annotation over frames. Returns Stopwatch.summary()
+    timer = Stopwatch()
+    preview = PreviewWorker(_render, size=(320, 240))  # only used synchronously, never started
+    preview.add_sink(_NullSink())
+    min_area = pipeline.scale_area(min_area, preview_size)
+    for i, raw in enumerate(itertools.chain(frames[:warmup], frames)):
+        if i == warmup:
+            pipeline.timer = timer
+        timer.start()
+        blobs = pipeline.blobs(pipeline.prepare(raw), threshold, k=1)
+        detected = blobs.biggest_area > min_area
+        if annotate:
+            contour = pipeline.to_frame_coords(blobs.contour(0), raw.shape) if detected else None
+            timer.lap('trace')
+            canvas = preview.draw(raw, contour)
+            timer.lap('annotate')
+            preview.send(canvas)
+            timer.lap('preview')
+        if i >= warmup:
+            timer.end()
+    pipeline.timer = None
+    return timer.summary()
+
+
+def load_frames(source, n):
+    frames = []
+    while len(frames) < n:
+        img = source.read()
+        if img is None:
+            if source.exhausted:
+                break
+            continue
+        frames.append(np.array(img))  # detach from memmaps etc. so reading isn't timed
+    source.close()
+    return frames
+
+
+def env_info():
+    here = pathlib.Path(__file__).parent
+    try:
+        revision = envt.git_hash(here)
+    except Exception:
+        revision = None
+    return {
+        'revision': revision,
+        'uname': platform.uname()._asdict(),
+        'python_version': platform.python_version(),
+        'opencv_version': cv2.__version__,
+        'numpy_version': np.__version__,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def parse_size(s):
+    w, h = s.lower().split('x')
+    return int(w), int(h)
+
+
+def main(args):
+    threshold = DEFAULT_THRESHOLD
+    if args.lab_cfg_path:
+        threshold = load_config(args.lab_cfg_path).thresholds[args.color]
+
+    # recorded frames have a fixed blob density, so only synthetic frames are swept over n_blobs
+    if args.source:
+        frame_sets = {None: load_frames(open_source(args.source), args.frames)}
+    else:
+        frame_sets = {n: load_frames(SyntheticSource(n_blobs=n, seed=args.seed, n_frames=args.frames), args.frames)
+                      for n in args.blobs}
+
+    results = []
+    for (n_blobs, frames), size, backend, lut_bits in itertools.product(
+            frame_sets.items(), args.sizes, args.backends, args.lut_bits):
+        if not frames:
+            print(f"No frames to benchmark from {args.source}")
+            sys.exit(1)
+        pipeline = DetectionPipeline(size, backend=backend, lut_bits=lut_bits or None)
+        stages = run(pipeline, frames, threshold, annotate=not args.no_annotate)
+        config = {
+            'source': args.source or 'synthetic',
+            'frame_shape': list(frames[0].shape),
+            'n_blobs': n_blobs,
+            'detection_size': list(size),
+            'backend': backend,
+            'lut_bits': lut_bits,
+            'frames': len(frames),
+        }
+        fps = 1e3 / stages['total']['mean_ms']
+        results.append({'config': config, 'stages': stages, 'fps': fps})
+
+        print(f"{size[0]}x{size[1]} {backend} lut={lut_bits} blobs={n_blobs}: {fps:.1f} fps")
+        for stage, t in stages.items():
+            print(f"    {stage:<12}median {t['median_ms']:8.3f} ms    p99 {t['p99_ms']:8.3f} ms")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'env': env_info(), 'results': results}, f, indent=1)
+        print(f"Saved results to {args.out}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage timing of the CameraBinaryProgram vision pipeline")
+    parser.add_argument("--source", default=None,
+                        help="A .npy stack of frames or a video file. Defaults to synthetic frames.")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", type=parse_size, nargs='+', default=[(640, 480), (320, 240), (160, 120)],
+                        help="Detection resolutions, i.e. 320x240")
+    parser.add_argument("--blobs", type=int, nargs='+', default=[1, 10, 100],
+                        help="Number of blobs in synthetic frames")
+    parser.add_argument("--backends", nargs='+', default=list(DetectionPipeline.BACKENDS),
+                        choices=DetectionPipeline.BACKENDS)
+    parser.add_argument("--lut_bits", type=int, nargs='+', default=[0],
+                        help="Color lookup table bit depths to try. 0 converts to LAB instead.")
+    parser.add_argument("--lab_cfg_path", default=None, help="Take the threshold from this lab_config.yaml")
+    parser.add_argument("--color", default='green', help="Color in lab_config.yaml to detect")
+    parser.add_argument("--no_annotate", action='store_true', help="Skip timing annotation and preview")
+    parser.add_argument("--out", default=None, help="Save results as JSON here")
+    main(parser.parse_args())
@@ -0,0 +1,235 @@
+# threaded frame capture into a single-slot latest-frame buffer
+
+import time
+import pathlib
+import threading
+from collections import namedtuple
+import numpy as np
+import cv2
+
+
+# seq increases by 1 for every frame published to a slot.
+# t_ns is the capture timestamp from time.time_ns(), so it lines up with io.tsv
+Frame = namedtuple('Frame', ['seq', 't_ns', 'image'])
+
+
+class FrameSlot:
+    """
+    Holds only the most recent frame.
+
+    The capture thread publishes into the slot, overwriting whatever was there.
+    Consumers block in wait_newer() until a frame newer than the one they last saw arrives,
+    so the same frame is never handed out twice and frames that were overwritten
+    before anyone read them show up as gaps in seq.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self.seq = -1
+        self.taken = -1  # seq of the last frame handed out by wait_newer()
+
+    def publish(self, image, t_ns=None):
+        t_ns = time.time_ns() if t_ns is None else t_ns
+        with self._cond:
+            self.seq += 1
+            self._frame = Frame(self.seq, t_ns, image)
+            self._cond.notify_all()
+
+    @property
+    def latest(self):
+        return self._frame
+
+    def wait_newer(self, seq=-1, timeout=None):
+        # returns the newest frame with frame.seq > seq, or None if none arrived before timeout
+        with self._cond:
+            if self._cond.wait_for(lambda: self.seq > seq, timeout):
+                self.taken = self.seq
+                self._cond.notify_all()
+                return self._frame
+        return None
+
+    def wait_taken(self, seq, timeout=None):
+        # block until frame seq (or a later one) has been handed out
+        with self._cond:
+            return self._cond.wait_for(lambda: self.taken >= seq, timeout)
+
+
+class FrameSource:
+    """
+    Where CaptureThread gets frames from.
+
+    read() returns the next BGR frame, or None if there isn't a new one yet.
+    Once a finite source runs out, it sets exhausted and keeps returning None.
+    Returned frames must not be modified afterwards, since they're shared
+    with detection, preview, and recording.
+    """
+    exhausted = False
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    """Reads frames from a HiWonder Camera.Camera, which runs its own reader thread."""
+
+    def __init__(self, camera):
+        self.camera = camera
+        self._last = None
+
+    def read(self):
+        # Camera.camera_task() assigns a new array to camera.frame for every frame,
+        # so identity tells us whether we've already seen this one.
+        img = self.camera.frame
+        if img is None or img is self._last:
+            return None
+        self._last = img
+        return img
+
+    def close(self):
+        self.camera.camera_close()
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, loop=False):
+        self.path = pathlib.Path(path)
+        self.loop = loop
+        self.cap = cv2.VideoCapture(str(self.path))
+        if not self.cap.isOpened():
+            raise FileNotFoundError(f"Couldn't open video file {self.path}")
+
+    def read(self):
+        if self.exhausted:
+            return None
+        ok, img = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, img = self.cap.read()
+        if not ok:
+            self.exhausted = True
+            return None
+        return img
+
+    def close(self):
+        self.cap.release()
+
+
+class NpyFramesSource(FrameSource):
+    """Frames from a memory-mapped .npy stack of shape (n, height, width, 3). Frames are read-only views."""
+
+    def __init__(self, path, loop=False):
+        self.path = pathlib.Path(path)
+        self.loop = loop
+        self.frames = np.load(self.path, mmap_mode='r')
+        if self.frames.ndim != 4 or self.frames.shape[-1] != 3:
+            raise ValueError(f"Expected frames of shape (n, height, width, 3) in {self.path}. Got {self.frames.shape}")
+        self.i = 0
+
+    def read(self):
+        if self.frames is None:  # closed
+            self.exhausted = True
+            return None
+        if self.i >= len(self.frames):
+            if not self.loop:
+                self.exhausted = True
+                return None
+            self.i = 0
+        img = self.frames[self.i]
+        self.i += 1
+        return img
+
+    def close(self):
+        self.frames = None  # drops the memory map; safe to call again
+
+
+class SyntheticSource(FrameSource):
+    """
+    Deterministic generated scenes: colored discs drifting over a noisy background.
+
+    The same seed always gives the same frames, so runs can be compared frame for frame.
+    color is BGR. n_frames=None generates forever.
+    """
+
+    def __init__(self, size=(640, 480), n_blobs=3, color=(0, 200, 0), seed=0, n_frames=None, noise=30):
+        self.size = tuple(size)
+        self.color = tuple(int(c) for c in color)
+        self.n_frames = n_frames
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        w, h = self.size
+        self.pos = self.rng.uniform((0, 0), (w, h), (n_blobs, 2))
+        self.vel = self.rng.uniform(-4, 4, (n_blobs, 2))
+        self.radii = self.rng.integers(5, max(6, h // 8), n_blobs)
+        self.i = 0
+
+    def read(self):
+        if self.n_frames is not None and self.i >= self.n_frames:
+            self.exhausted = True
+            return None
+        w, h = self.size
+        img = self.rng.integers(0, self.noise + 1, (h, w, 3), dtype=np.uint8)
+        img += 40
+        for (x, y), r in zip(self.pos, self.radii):
+            cv2.circle(img, (int(x), int(y)), int(r), self.color, -1)
+        # drift, bouncing off the edges
+        self.pos += self.vel
+        out = (self.pos < 0) | (self.pos > (w, h))
+        self.vel[out] *= -1
+        self.pos = np.clip(self.pos, 0, (w, h))
+        self.i += 1
+        return img
+
+
+def open_source(spec, loop=False):
+    # pick a FrameSource from a string: 'synthetic', 'synthetic:<n_blobs>', a .npy stack, or a video file
+    if spec.startswith('synthetic'):
+        _, _, n = spec.partition(':')
+        return SyntheticSource(n_blobs=int(n) if n else 3)
+    path = pathlib.Path(spec)
+    if path.suffix == '.npy':
+        return NpyFramesSource(path, loop=loop)
+    return VideoFileSource(path, loop=loop)
+
+
+class CaptureThread:
+    def __init__(self, source, slot=None, idle=0.001, lockstep=False):
+        self._run = True
+        self.source = source
+        self.slot = FrameSlot() if slot is None else slot
+        self.idle = idle  # seconds to wait when the source has nothing new
+        # in lockstep, wait for each frame to be taken before reading the next,
+        # so no frames are dropped and every run sees the same frames
+        self.lockstep = lockstep
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+
+    @property
+    def done(self):
+        # the source has run out and everything it produced has been handed out
+        return self.source.exhausted and self.slot.taken >= self.slot.seq
+
+    def start(self):
+        self.thread.start()
+
+    def loop(self):
+        while self._run:
+            img = self.source.read()
+            if img is None:
+                if self.source.exhausted:
+                    break
+                time.sleep(self.idle)
+                continue
+            self.slot.publish(img)
+            if self.lockstep:
+                while self._run and not self.slot.wait_taken(self.slot.seq, timeout=0.1):
+                    pass
+
+    def stop(self):
+        self._run = False
+
+    def spin_until_dead(self, timeout=3):
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print("Timed out waiting for capture thread to die.")
@@ -0,0 +1,53 @@
+# skip detection when the scene hasn't changed
+
+import numpy as np
+import cv2
+
+
+class ChangeGate:
+    """
+    Cheap check for whether a frame differs enough from the last one detection ran on.
+
+    Frames are shrunk to a tiny thumbnail (INTER_AREA, so each pixel is the average of a tile)
+    and compared with the thumbnail of the last frame that was let through. The difference is
+    the biggest change in any one tile's average, in 0-255 pixel levels, so sensor noise averages
+    out but a small blob moving in one corner still counts. Comparing against
+    the last evaluated frame rather than the previous frame means slow drift still adds up
+    and eventually gets through. Every `refresh` frames a frame is let through regardless.
+    """
+
+    def __init__(self, threshold=8.0, refresh=30, size=(32, 24)):
+        self.threshold = threshold
+        self.refresh = refresh
+        self.size = size
+        w, h = size
+        self.reference = np.empty((h, w, 3), np.uint8)
+        self.thumb = np.empty((h, w, 3), np.uint8)
+        self.diff = np.empty((h, w, 3), np.uint8)
+        self.has_reference = False
+        self.since_pass = 0
+        self.last_difference = 0
+        self.passed = 0
+        self.skipped = 0
+
+    def changed(self, raw):
+        # True if detection should run on this frame
+        cv2.resize(raw, self.size, dst=self.thumb, interpolation=cv2.INTER_AREA)
+        if self.has_reference and self.since_pass + 1 < self.refresh:
+            cv2.absdiff(self.thumb, self.reference, dst=self.diff)
+            self.last_difference = int(self.diff.max())
+            if self.last_difference < self.threshold:
+                self.since_pass += 1
+                self.skipped += 1
+                return False
+        self.reference, self.thumb = self.thumb, self.reference
+        self.has_reference = True
+        self.since_pass = 0
+        self.passed += 1
+        return True
+
+    def reset(self):
+        self.has_reference = False
+
+    def as_config_dict(self):
+        return {'threshold': self.threshold, 'refresh': self.refresh, 'size': list(self.size)}
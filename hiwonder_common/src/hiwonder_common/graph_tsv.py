@@ -15,13 +15,14 @@ except ImportError:
     from more_itertools import pairwise
 
 try:
-    from hiwonder_common import project
+    from hiwonder_common import project, runlog
 except ImportError:
     try:
         import project
+        import runlog
     except ImportError:
         print("hiwonder_common not found. Certain features will not work.")
-        project = None
+        project = runlog = None
 
 
 def hr(h, s, l):  # noqa: E741
@@ -77,15 +78,20 @@ def get_moves(data):
     ts = data.iloc[:, 0]
     # ts = get_time_from_start(data)
 
-    moves = data.iloc[:, -1]
-    moves = moves.apply(eval)  # time consuming
-    moves = moves.apply(get_last_move)
-    moves = moves.apply(pd.Series, index=['v', 'd', 'w'])
-    v = moves['v']
-    w = moves['w']
+    if 'n_moves' in data.columns:  # from io.bin, where the last move is already in columns
+        v = data['v']
+        w = data['w']
+        inputs = data.iloc[:, 1:data.columns.get_loc('n_moves')]
+    else:
+        moves = data.iloc[:, -1]
+        moves = moves.apply(eval)  # time consuming
+        moves = moves.apply(get_last_move)
+        moves = moves.apply(pd.Series, index=['v', 'd', 'w'])
+        v = moves['v']
+        w = moves['w']
+        inputs = data.iloc[:, 1:-1]
 
     sense = None
-    inputs = data.iloc[:, 1:-1]
 
     if not inputs.empty:
         # create green vertical spanning regions for sensors
@@ -178,7 +184,18 @@ def make_project(filename=None, root=None):
         return project.make_default_project(filename, root=root)
 
 
+def read_runlog(filename):
+    # same columns as io.tsv, except the moves column is replaced by n_moves and the last move's v, d, w
+    records, header = runlog.read_runlog(filename)
+    fields = runlog.row_fields(records)
+    columns = {label: records[name] for label, name in zip(header['columns'], fields)}
+    v, d, w = runlog.last_moves(records).T
+    return pd.DataFrame({**columns, 'n_moves': records['n_moves'], 'v': v, 'd': d, 'w': w})
+
+
 def read_file(filename):
+    if filename.suffix == '.bin':
+        return read_runlog(filename)
     sep = '\t' if filename.suffix == '.tsv' else ','
     return pd.read_csv(filename, sep=sep, skiprows=[], parse_dates=True)
 
@@ -206,7 +223,8 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     if project:
-        filename = make_project(args.filename, root='logs').root / 'io.tsv'
+        root = make_project(args.filename, root='logs').root
+        filename = root / 'io.bin' if (root / 'io.bin').is_file() else root / 'io.tsv'
     else:
         filename = args.filename
 
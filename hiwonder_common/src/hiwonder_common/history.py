@@ -0,0 +1,87 @@
+# fixed-size per-frame history kept in a numpy record array
+
+import numpy as np
+
+# the last move of a frame; NaN with n_moves == 0 if it didn't move
+MOVE_FIELDS = [('n_moves', 'u2'), ('v', 'f4'), ('d', 'f4'), ('w', 'f4')]
+NO_MOVE = (0, np.nan, np.nan, np.nan)
+
+
+def last_move(moves):
+    # (n_moves, v, d, w) for a frame's list of (v, d, w) moves
+    if not moves:
+        return NO_MOVE
+    return (len(moves), *moves[-1])
+
+
+class History:
+    """
+    Ring buffer of the last `capacity` records of a numpy structured dtype.
+
+    append() overwrites the oldest record once full, so memory stays constant however long
+    the run is. history[-1] is the newest record and recent(n) gives the last n as a record
+    array in order, i.e. history.recent(30)['smoothed_detected'].mean().
+
+    If spill is a path, every full buffer is appended to that file before being overwritten
+    (and whatever's left on close()), so nothing is lost. Read it back with History.load().
+    """
+
+    def __init__(self, dtype, capacity=4096, spill=None):
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.data = np.zeros(capacity, self.dtype)
+        self.count = 0  # records ever appended
+        self.spill = spill
+        self.spilled = 0
+        self._spill_file = None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __getitem__(self, i):
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError(f"history index {i} out of range for {n} records")
+        return self.data[(self.count - n + i % n) % self.capacity]
+
+    def append(self, record):
+        i = self.count % self.capacity
+        self.data[i] = record
+        self.count += 1
+        if self.spill and i == self.capacity - 1:
+            self._write(self.data)
+
+    def recent(self, n=None):
+        # the last n records, oldest first. A copy if the buffer has wrapped, a view otherwise.
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % self.capacity or (self.capacity if self.count else 0)
+        if n <= end:
+            return self.data[end - n:end]
+        return np.concatenate((self.data[self.capacity - (n - end):], self.data[:end]))
+
+    def _write(self, records):
+        if self._spill_file is None:
+            self._spill_file = open(self.spill, 'ab')
+        records.tofile(self._spill_file)
+        self.spilled += len(records)
+
+    def close(self):
+        # spill the records that haven't been written yet
+        if self.spill and self.count > self.spilled:
+            self._write(self.recent(self.count - self.spilled))
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    @staticmethod
+    def load(path, dtype):
+        return np.fromfile(path, dtype=np.dtype(dtype))
+
+    def as_config_dict(self):
+        return {
+            'capacity': self.capacity,
+            'count': self.count,
+            'spill': str(self.spill) if self.spill else None,
+            'spilled': self.spilled,
+            'dtype': [(name, self.dtype[name].str) for name in self.dtype.names],
+        }
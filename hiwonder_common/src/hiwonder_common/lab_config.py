@@ -0,0 +1,90 @@
+# lab_config.yaml compiled once into detection thresholds, and reloaded when the file changes
+
+import os
+import time
+import threading
+from collections import namedtuple
+import yaml
+
+
+# thresholds: {color: ((l, a, b), (l, a, b))} as tuples, ready for cv2.inRange and DetectionPipeline
+# lab_data: the yaml as loaded. mtime_ns: modification time of the file it came from
+DetectionConfig = namedtuple('DetectionConfig', ['thresholds', 'lab_data', 'mtime_ns'])
+
+
+def compile_config(lab_data, mtime_ns=None):
+    thresholds = {
+        color: (tuple(int(v) for v in entry['min']), tuple(int(v) for v in entry['max']))
+        for color, entry in lab_data.items()
+        if isinstance(entry, dict) and len(entry.get('min', ())) == 3 and len(entry.get('max', ())) == 3
+    }
+    return DetectionConfig(thresholds, lab_data, mtime_ns)
+
+
+def load_config(path):
+    mtime_ns = os.stat(path).st_mtime_ns
+    with open(path, 'r', encoding='utf-8') as f:
+        lab_data = yaml.load(f, Loader=yaml.FullLoader)
+    return compile_config(lab_data, mtime_ns)
+
+
+class ConfigWatcher:
+    """
+    Reloads a lab_config.yaml whenever its modification time changes.
+
+    Polls on its own thread so the control loop never touches the filesystem. Each reload
+    builds a whole new DetectionConfig and hands it to on_change(config), which should just
+    assign it somewhere; swapping one reference is atomic, so the loop sees either the old
+    config or the new one and never half of each. A file that fails to load, or that's
+    missing a color the current config has (i.e. caught mid-save), is skipped and retried
+    on the next change.
+    """
+
+    def __init__(self, path, on_change, config=None, interval=1.0):
+        self._run = True
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.config = config  # the last config handed to on_change
+        self.mtime_ns = config.mtime_ns if config else None
+        self.reloads = 0
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def loop(self):
+        while self._run:
+            time.sleep(self.interval)
+            self.check()
+
+    def check(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime_ns == self.mtime_ns:
+            return False
+        self.mtime_ns = mtime_ns
+        try:
+            config = load_config(self.path)
+        except Exception as err:
+            print(f"Couldn't reload {self.path}: {err}")
+            return False
+        missing = set(self.config.thresholds) - set(config.thresholds) if self.config else set()
+        if missing:
+            print(f"Not reloading {self.path}: no complete min and max for {', '.join(sorted(missing))}")
+            return False
+        self.config = config
+        self.reloads += 1
+        self.on_change(config)
+        return True
+
+    def stop(self):
+        self._run = False
+
+    def spin_until_dead(self, timeout=3):
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        if self.thread.is_alive():
+            print("Timed out waiting for config watcher to die.")
@@ -0,0 +1,75 @@
+# glass-to-motor latency: how old a frame is by the time it turns into a motor command
+
+from collections import deque
+import numpy as np
+
+
+class LatencyRecorder:
+    """
+    Per-frame latencies between capture, detection, decision, and actuation.
+
+    All timestamps are time.time_ns(), like capture.Frame.t_ns and io.tsv.
+    capture_to_detect: frame captured -> blobs found (includes waiting in the frame slot or pool)
+    detect_to_decide: blobs found -> detected/not detected
+    decide_to_actuate: decision -> chassis.set_velocity() returned
+    glass_to_motor: the whole thing, capture -> set_velocity() returned
+
+    Frames that didn't move the motors (i.e. --dry_run) have no actuation latencies.
+    If log is a project.Logger, each frame is also written to it as a row.
+    Median and p99 are over the last `history` frames; mean, max, and n cover the whole run.
+    """
+
+    STAGES = ('capture_to_detect', 'detect_to_decide', 'decide_to_actuate', 'glass_to_motor')
+
+    def __init__(self, log=None, history=10000):
+        self.log = log
+        self.samples = {stage: deque(maxlen=history) for stage in self.STAGES}
+        self.count = dict.fromkeys(self.STAGES, 0)
+        self.total_ns = dict.fromkeys(self.STAGES, 0)
+        self.max_ns = dict.fromkeys(self.STAGES, 0)
+        if self.log is not None:
+            self.log.firstcall = self.log_header
+
+    def log_header(self):
+        self.log += "frame_seq\tcapture_ns\t" + "\t".join(f"{stage}_ns" for stage in self.STAGES) + "\n"
+
+    def record(self, seq, capture_ns, detect_ns, decide_ns, actuate_ns=None):
+        latencies = [detect_ns - capture_ns, decide_ns - detect_ns]
+        if actuate_ns is not None:
+            latencies += [actuate_ns - decide_ns, actuate_ns - capture_ns]
+        for stage, ns in zip(self.STAGES, latencies):
+            self.samples[stage].append(ns)
+            self.count[stage] += 1
+            self.total_ns[stage] += ns
+            self.max_ns[stage] = max(self.max_ns[stage], ns)
+        if self.log is not None:
+            latencies += [''] * (len(self.STAGES) - len(latencies))
+            self.log += f"{seq}\t{capture_ns}\t" + "\t".join(str(ns) for ns in latencies) + "\n"
+        return latencies
+
+    def summary(self):
+        d = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.array(samples, np.int64) / 1e6
+            n = self.count[stage]
+            d[stage] = {
+                'median_ms': float(np.median(ms)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'mean_ms': self.total_ns[stage] / n / 1e6,
+                'max_ms': self.max_ns[stage] / 1e6,
+                'n': n,
+            }
+        return d
+
+    def print_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print("Latency (ms)          median      p99     mean      max")
+        for stage, s in summary.items():
+            print(f"  {stage:<18}{s['median_ms']:9.2f}{s['p99_ms']:9.2f}{s['mean_ms']:9.2f}{s['max_ms']:9.2f}")
+
+    def as_config_dict(self):
+        return self.summary()
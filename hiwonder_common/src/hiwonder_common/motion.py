@@ -0,0 +1,67 @@
+# fewer, rate-limited writes to the motor controller
+
+import time
+import threading
+
+
+class MotionCommander:
+    """
+    Sits in front of chassis.set_velocity() and only writes when it would make a difference.
+
+    Each set_velocity() on the MecanumChassis is a round of bus writes to the motor controller.
+    A command identical to the last one written is suppressed, except that it's resent
+    every `keepalive` seconds in case the controller missed or lost it. A changed command
+    is written right away unless the last write was less than 1 / max_rate seconds ago;
+    then it's dropped, and since it still differs from what was written, the next call
+    after the interval sends whatever is being asked for by then.
+    Stopping (v and w both 0) is never rate-limited, only deduplicated. force=True always writes.
+    It's called from the control loop, the button and UDP callback threads, and signal
+    handlers (stop() and pause()). The lock keeps the threads from interleaving. It's
+    re-entrant because a signal handler runs on the main thread, possibly in the middle of a
+    set_velocity() that already holds it; the handler's stop is written right away, and if
+    the interrupted write then finishes, that command is what's recorded as sent, so the next
+    stop from the control loop isn't suppressed as a duplicate.
+    """
+
+    def __init__(self, chassis, max_rate=50.0, keepalive=0.5):
+        self.chassis = chassis
+        self.max_rate = max_rate
+        self.keepalive = keepalive
+        self.sent = None  # (v, a, w) last written
+        self.sent_t = 0.0  # time.monotonic() of the last write
+        self.writes = 0
+        self.duplicates = 0  # suppressed because the same command was already in effect
+        self.rate_limited = 0  # suppressed because the last write was too recent
+        self.lock = threading.RLock()
+
+    def set_velocity(self, v, a, w, force=False):
+        # returns True if (v, a, w) is what the motors were last told, whether or not it was written now
+        command = (v, a, w)
+        stopping = v == 0 and w == 0  # the direction doesn't matter at zero speed
+        with self.lock:
+            now = time.monotonic()
+            since = now - self.sent_t
+            if not force:
+                if command == self.sent and since < self.keepalive:
+                    self.duplicates += 1
+                    return True
+                if command != self.sent and since < 1 / self.max_rate and not stopping:
+                    self.rate_limited += 1
+                    return False
+            self.chassis.set_velocity(v, a, w)
+            self.sent = command
+            self.sent_t = now
+            self.writes += 1
+            return True
+
+    def stop(self):
+        return self.set_velocity(0, 0, 0, force=True)
+
+    def as_config_dict(self):
+        return {
+            'max_rate': self.max_rate,
+            'keepalive': self.keepalive,
+            'writes': self.writes,
+            'duplicates': self.duplicates,
+            'rate_limited': self.rate_limited,
+        }
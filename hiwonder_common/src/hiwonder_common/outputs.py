@@ -0,0 +1,59 @@
+# skip LED and buzzer writes that wouldn't change anything
+
+import time
+
+
+class OutputCache:
+    """
+    Shadow copy of what the RGB LEDs and the buzzer were last set to.
+
+    Writes that would leave the hardware as it is are skipped and counted in `avoided`.
+    Each setPixelColor(), RGB.show(), and buzzer change counts as one write.
+    Other processes (i.e. buttonman) can also set the LEDs, so unchanged LEDs are still
+    rewritten every `refresh` seconds if something keeps asking for them.
+    """
+
+    def __init__(self, board, buzzer, refresh=1.0):
+        self.board = board
+        self.buzzer = buzzer  # function that writes the buzzer pin
+        self.refresh = refresh
+        self.pixels = {}  # LED index -> (r, g, b) last shown
+        self.shown_t = 0.0  # time.monotonic() of the last RGB.show()
+        self.buzzer_state = None
+        self.writes = 0
+        self.avoided = 0
+
+    def set_rgb(self, rgb, indices=(0, 1)):
+        # returns True if anything was written
+        rgb = tuple(rgb)
+        stale = time.monotonic() - self.shown_t >= self.refresh
+        changed = [i for i in indices if stale or self.pixels.get(i) != rgb]
+        self.avoided += len(indices) - len(changed)
+        if not changed:
+            self.avoided += 1  # and the show()
+            return False
+        for i in changed:
+            self.board.RGB.setPixelColor(i, self.board.PixelColor(*rgb))
+            self.pixels[i] = rgb
+        self.board.RGB.show()
+        self.shown_t = time.monotonic()
+        self.writes += len(changed) + 1
+        return True
+
+    def set_buzzer(self, value):
+        value = bool(value)
+        if value == self.buzzer_state:
+            self.avoided += 1
+            return False
+        self.buzzer(value)
+        self.buzzer_state = value
+        self.writes += 1
+        return True
+
+    def invalidate(self):
+        # forget the shadow state so the next writes go through, i.e. after something else used the LEDs
+        self.pixels.clear()
+        self.buzzer_state = None
+
+    def as_config_dict(self):
+        return {'refresh': self.refresh, 'writes': self.writes, 'avoided': self.avoided}
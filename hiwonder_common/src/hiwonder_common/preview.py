@@ -0,0 +1,237 @@
+# annotated preview rendering, off the control loop
+
+import time
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import cv2
+
+
+def draw_fitted_rect(img, contour, color):
+    # draw rotated fitted rectangle around contour
+    rect = cv2.minAreaRect(contour)
+    box = np.intp(cv2.boxPoints(rect))  # type: ignore
+    cv2.drawContours(img, [box], -1, color, 2)
+
+
+def draw_text(img, color, name):
+    # Print the detected color on the screen
+    cv2.putText(img, f"Color: {name}", (10, img.shape[0] - 10),
+        cv2.FONT_HERSHEY_SIMPLEX, 0.65, color, 2)
+
+
+def draw_fps(img, color, fps):
+    # Print the detected color on the screen
+    cv2.putText(img, f"fps: {fps:.3}", (10, 20),
+        cv2.FONT_HERSHEY_SIMPLEX, 0.65, color, 2)
+
+
+class WindowSink:
+    """Shows previews in a cv2 window. Needs a display; see CameraBinaryProgram.can_show_windows()"""
+    active = True
+
+    def __init__(self, name='frame'):
+        self.name = name
+
+    def send(self, img):
+        cv2.imshow(self.name, img)
+        cv2.waitKey(1)
+
+    def close(self):
+        cv2.destroyWindow(self.name)
+
+
+class MJPEGSink:
+    """
+    Serves previews as an MJPEG stream over HTTP, for robots without a display.
+
+    Open http://<robot>:<port>/ in a browser, or /frame.jpg for a single frame.
+    The sink is only active while a client is connected, and then at most max_fps times
+    a second, so nothing is drawn or JPEG-encoded when nobody is watching.
+    Encoding happens in send(), on the PreviewWorker thread; each client gets its own
+    server thread that just writes out the latest JPEG.
+    """
+
+    def __init__(self, port=8080, host='', max_fps=10.0, quality=70):
+        self.max_fps = max_fps
+        self.quality = quality
+        self.clients = 0
+        self.jpeg = None
+        self.seq = 0  # increases with every encoded frame
+        self._last = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def active(self):
+        return self.clients > 0 and time.monotonic() - self._last >= 1 / self.max_fps
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def send(self, img):
+        self._last = time.monotonic()
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        with self._cond:
+            self.jpeg = buf.tobytes()
+            self.seq += 1
+            self._cond.notify_all()
+
+    def next_jpeg(self, seq, timeout=1.0):
+        # (seq, jpeg) once there's a frame newer than seq, or (seq, None) on timeout or close
+        with self._cond:
+            if self._cond.wait_for(lambda: self.seq > seq or self._closed, timeout) and not self._closed:
+                return self.seq, self.jpeg
+        return seq, None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self.thread.is_alive():
+            self.server.shutdown()
+        self.server.server_close()
+
+    def _make_handler(self):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ('/', '/stream', '/frame.jpg'):
+                    self.send_error(404)
+                    return
+                with sink._cond:
+                    sink.clients += 1
+                try:
+                    if self.path == '/frame.jpg':
+                        self.send_one()
+                    else:
+                        self.stream()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client went away
+                finally:
+                    with sink._cond:
+                        sink.clients -= 1
+
+            def send_one(self):
+                _seq, jpeg = sink.next_jpeg(sink.seq, timeout=3)  # a fresh one, not whatever was left over
+                if jpeg is None:
+                    self.send_error(503, "No frames yet")
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+            def stream(self):
+                self.send_response(200)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                self.end_headers()
+                seq = 0
+                while not sink._closed:
+                    seq, jpeg = sink.next_jpeg(seq)
+                    if jpeg is None:
+                        continue
+                    self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n')
+                    self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                    self.wfile.write(jpeg)
+                    self.wfile.write(b'\r\n')
+
+            def log_message(self, format, *args):
+                pass  # don't print a line for every request
+
+        return Handler
+
+
+class PreviewWorker:
+    """
+    Renders annotated previews on a background thread and hands them to sinks.
+
+    The control loop calls submit() with the frame and whatever render() needs to draw on it.
+    Nothing is copied or drawn unless some sink is active, and when the worker falls behind,
+    submit() drops the item instead of blocking, so a slow display never stalls control.
+
+    render(canvas, info) draws onto canvas, a copy of the submitted frame.
+    Frames must not be modified after they're submitted.
+    """
+
+    def __init__(self, render, size=(320, 240), maxsize=2):
+        self._run = True
+        self.render = render
+        self.size = size  # (width, height) of the images sent to sinks
+        self.sinks = []
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.canvas = None
+        self.preview = None
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+
+    @property
+    def active(self):
+        return any(sink.active for sink in self.sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def submit(self, image, info=None):
+        if not self.active:
+            return False
+        try:
+            self.queue.put_nowait((image, info))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def start(self):
+        self.thread.start()
+
+    def loop(self):
+        while self._run:
+            try:
+                image, info = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self.send(self.draw(image, info))
+
+    def draw(self, image, info):
+        # copy of the frame that's safe to draw on, reused between frames
+        if self.canvas is None or self.canvas.shape != image.shape:
+            self.canvas = np.empty_like(image)
+        np.copyto(self.canvas, image)
+        self.render(self.canvas, info)
+        return self.canvas
+
+    def send(self, img):
+        w, h = self.size
+        if self.preview is None or self.preview.shape[:2] != (h, w):
+            self.preview = np.empty((h, w) + img.shape[2:], img.dtype)
+        preview = cv2.resize(img, (w, h), dst=self.preview)
+        for sink in self.sinks:
+            if sink.active:
+                sink.send(preview)
+
+    def stop(self):
+        self._run = False
+
+    def spin_until_dead(self, timeout=3):
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        if self.thread.is_alive():
+            print("Timed out waiting for preview thread to die.")
+        for sink in self.sinks:
+            sink.close()
@@ -26,6 +26,12 @@ import HiwonderSDK.mecanum as mecanum
 import hiwonder_common.statistics_tools as st
 import hiwonder_common.project as project
 import hiwonder_common.env_tools as envt
+from hiwonder_common.scheduler import RateScheduler
+from hiwonder_common.motion import MotionCommander
+from hiwonder_common.outputs import OutputCache
+from hiwonder_common.beeper import BeepScheduler
+from hiwonder_common.history import History, MOVE_FIELDS, last_move
+from hiwonder_common.runlog import RunLogWriter
 
 # typing
 from typing import Any, Union
@@ -118,14 +124,18 @@ range_rgb = {
 
 
 class Program:
-    dict_names = {'servo_cfg_path', 'servo_data', 'servo1', 'servo2', 'detection_log', 'dry_run', 'start_time'}
+    dict_names = {'servo_cfg_path', 'servo_data', 'servo1', 'servo2', 'detection_log', 'dry_run', 'start_time', 'scheduler', 'motion', 'output_cache', 'history', 'runlog'}  # noqa: E501
     UDP_LISTENER_CLASS = UDP_Listener
+    HISTORY_DTYPE = [('time_ns', 'i8')] + MOVE_FIELDS
+    RUNLOG_FIELDS = [('time_ns', 'i8')]  # io.bin columns before the moves, matching detection_row()
 
     def __init__(self, args, post_init=True, board=None, name=None, disable_logging=False) -> None:
         self._run = not args.start_paused
         self._stop_soon = False
 
         self.chassis = mecanum.MecanumChassis()
+        # all velocity commands go through here so repeats and bursts don't hit the motor controller
+        self.motion = MotionCommander(self.chassis, getattr(args, 'max_command_rate', 50.0))
 
         self.servo_cfg_path = getattr(args, 'servo_cfg_path', SERVO_CFG_PATH)
 
@@ -133,26 +143,42 @@ class Program:
         self.load_servo_config(self.servo_cfg_path)
         self.name = self.__class__.__name__ if name is None else name
 
-        if disable_logging:
-            self.p = self.detection_log = None
-        else:
+        # with log_interval > 0, log files are written in batches by a background thread
+        self.log_interval = getattr(args, 'log_interval', 1.0)
+        self.log_fsync = getattr(args, 'log_fsync', False)
+        # io.tsv and/or the same rows in the binary io.bin (see runlog.py)
+        log_format = getattr(args, 'log_format', 'both')
+        self.p = self.detection_log = self.runlog = None
+        if not disable_logging:
             self.p = project.make_default_project(args.project, args.root, suffix=self.name)
             self.p.make_root_interactive()
-            self.detection_log = project.Logger(self.p.root / f"io.tsv")
-            self.detection_log.firstcall = self.log_detection_header
+            if log_format in ('tsv', 'both'):
+                self.detection_log = self.make_logger(self.p.root / f"io.tsv")
+                self.detection_log.firstcall = self.log_detection_header
+            if log_format in ('bin', 'both'):
+                self.runlog = RunLogWriter(self.p.root / "io.bin", self.RUNLOG_FIELDS, self.detection_columns,
+                                           getattr(args, 'log_max_moves', 4))
 
         self.board = Board if board is None else board
+        self.output_cache = OutputCache(self.board, self.buzzer)  # LED and buzzer writes skip repeats
+        self.beeper = BeepScheduler(self.output_cache.set_buzzer)  # beeps play without blocking the loop
 
         self.servo1: int
         self.servo2: int
 
         self.dry_run = args.dry_run
+        # with --rate, main_loop runs at a fixed rate instead of as fast as it can
+        rate = getattr(args, 'rate', None)
+        self.scheduler = RateScheduler(rate) if rate else None
         self.fps = 0.0
         self.fps_averager = st.Average(10)
 
         self.start_time = time.time_ns()
         self.moves_this_frame = []
-        self.history = []  # movement history
+        # the last history_size frames; with --spill_history, older ones are saved to history.bin
+        spill = self.p.root / "history.bin" if self.p and getattr(args, 'spill_history', False) else None
+        self.history = History(self.HISTORY_DTYPE, getattr(args, 'history_size', 4096), spill)
+        self.actuated_ns = None  # time.time_ns() when the motors were last known to be running the requested move
 
         GPIO.setup(KEY1_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
@@ -168,6 +194,11 @@ class Program:
         if post_init:
             self.startup_beep()
 
+    def make_logger(self, path):
+        if self.log_interval:
+            return project.BufferedLogger(path, interval=self.log_interval, fsync=self.log_fsync)
+        return project.Logger(path)
+
     def save_artifacts(self):
         self.p.save_yaml_artifact("runinfo.yaml", self)
         return True
@@ -232,11 +263,11 @@ class Program:
         self.servo_data = self.get_yaml_data(servo_cfg_path)
 
     def kill_motors(self):
-        self.chassis.set_velocity(0, 0, 0)
+        self.motion.set_velocity(0, 0, 0)  # stops skip the rate limit; in dry_run nothing would resend it
 
     def pause(self):
         self._run = False
-        self.chassis.set_velocity(0, 0, 0)
+        self.motion.stop()
         print(f"Program Paused w/ PID: {os.getpid()}")
 
     def resume(self):
@@ -247,9 +278,24 @@ class Program:
         self._stop_soon = True
         if not silent:
             print(f"|> stop() {self.__class__} called <|")
+        self.history.close()
+        if self.detection_log:
+            self.detection_log.close()
+        if self.runlog:
+            self.runlog.close()
+        if self.p:
+            self.save_artifacts()  # runinfo.yaml gets the final loop timing and motor command stats
+        if not silent:
+            m = self.motion
+            print(f"Motor commands: {m.writes} written, {m.duplicates} duplicates and {m.rate_limited} rate-limited suppressed.")  # noqa: E501
+            print(f"LED/buzzer: {self.output_cache.writes} writes, {self.output_cache.avoided} avoided.")
+            if getattr(self.detection_log, 'dropped', 0):
+                log = self.detection_log
+                print(f"{log.dropped} lines of {log} were dropped ({log.error or 'the write queue was full'}).")
         self.udp_listener.stop()
         self._run = False
-        self.chassis.set_velocity(0, 0, 0)
+        self.motion.stop()
+        self.beeper.cancel()
         self.set_rgb('None')
         if exit:
             if buttonman:
@@ -261,12 +307,9 @@ class Program:
     def buzzer(value):
         GPIO.output(BUZZER_PIN, bool(value))
 
-    @classmethod
-    def buzzfor(cls, dton, dtoff=0.0):
-        cls.buzzer(1)
-        time.sleep(dton)
-        cls.buzzer(0)
-        time.sleep(dtoff)
+    def buzzfor(self, dton, dtoff=0.0):
+        # returns immediately; the beep is played by self.beeper
+        self.beeper.play([(dton, dtoff)])
 
     def set_rgb(self, color: Union[str, tuple, list]):
         # Set the RGB light color of the expansion board to match the color you want to track
@@ -277,9 +320,7 @@ class Program:
             r, g, b = range_rgb[color]
         else:
             r, g, b = color
-        self.board.RGB.setPixelColor(0, self.board.PixelColor(r, g, b))
-        self.board.RGB.setPixelColor(1, self.board.PixelColor(r, g, b))
-        self.board.RGB.show()
+        self.output_cache.set_rgb((r, g, b))  # only writes if the color changed
 
     def move(self, v, a, w):
         # linear power [0, 100], direction angle [0, 360] (90 is forwards), yaw angular speed [-2,2]
@@ -287,7 +328,8 @@ class Program:
             return
         # move and log
         self.moves_this_frame.append((v, a, w))
-        self.chassis.set_velocity(v, a, w)
+        if self.motion.set_velocity(v, a, w):
+            self.actuated_ns = time.time_ns()
 
     def control(self):
         self.set_rgb('blue')
@@ -295,16 +337,30 @@ class Program:
 
     def control_wrapper(self):
         self.control()
-        if self.detection_log:
-            self.history.append([time.time_ns(), self.moves_this_frame])
+        self.history.append(self.history_record())
+        if self.detection_log or self.runlog:
             self.log_detection()
 
+    def history_record(self):
+        # one row of self.history, in HISTORY_DTYPE field order
+        return (time.time_ns(), *last_move(self.moves_this_frame))
+
+    def detection_row(self):
+        # the logged values for this frame, before the moves
+        return (int(self.history[-1]['time_ns']),)
+
+    def detection_columns(self):
+        return ['time_ns', 'moves [(v, d, w), ...]']
+
     def log_detection(self):
-        t, moves_this_frame = self.history[-1]
-        self.detection_log += f"{t}\t{repr(moves_this_frame)}\n"
+        row = self.detection_row()
+        if self.runlog:
+            self.runlog.write(row, self.moves_this_frame)
+        if self.detection_log:
+            self.detection_log += '\t'.join(str(x) for x in row) + f"\t{repr(self.moves_this_frame)}\n"
 
     def log_detection_header(self):
-        self.detection_log += f"time_ns\tmoves [(v, d, w), ...]\n"
+        self.detection_log += '\t'.join(self.detection_columns()) + '\n'
 
     def main_loop(self):
         self.moves_this_frame = []
@@ -347,8 +403,13 @@ class Program:
                     self.stop()
                 if not self._run:
                     self.kill_motors()
-                    time.sleep(0.01)
+                    if self.scheduler:
+                        self.scheduler.wait()
+                    else:
+                        time.sleep(0.01)
                     continue
+                if self.scheduler:
+                    self.scheduler.wait()
                 loop()
             except KeyboardInterrupt:
                 print('Received KeyboardInterrupt')
@@ -378,6 +439,20 @@ def get_parser(parser, subparsers=None):
     parser.add_argument("project", nargs='?', help="Path or name of project directory. Include a slash to specify a path.")
     parser.add_argument("--root", help="Path or name of project root directory.")
     parser.add_argument("--nolog", action='store_true')
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Run the control loop at this many Hz. Default: as fast as possible.")
+    parser.add_argument("--max_command_rate", type=float, default=50.0,
+                        help="Send the motor controller at most this many changed velocity commands per second.")
+    parser.add_argument("--log_interval", type=float, default=1.0,
+                        help="Write log files in batches at least this often, in seconds. 0 writes every line as it's logged.")  # noqa: E501
+    parser.add_argument("--log_fsync", action='store_true', help="fsync log files after every batch.")
+    parser.add_argument("--log_format", choices=('tsv', 'bin', 'both'), default='both',
+                        help="Log each frame to io.tsv, the binary io.bin, or both. io.bin can be exported to TSV with hiwonder_common.runlog.")  # noqa: E501
+    parser.add_argument("--log_max_moves", type=int, default=4, help="Moves per frame kept in io.bin.")
+    parser.add_argument("--history_size", type=int, default=4096,
+                        help="Number of frames of history to keep in memory.")
+    parser.add_argument("--spill_history", action='store_true',
+                        help="Save history that's about to be overwritten to history.bin in the project directory.")
     return parser, subparsers
 
 
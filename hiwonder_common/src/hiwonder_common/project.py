@@ -8,7 +8,10 @@ import os
 import re
 import sys
 import time
+import atexit
 import shutil
+import threading
+import collections
 import pathlib
 import platform
 import yaml
@@ -25,7 +28,7 @@ if hasattr(os, 'geteuid') and os.geteuid() == 0:
     os.umask(0o000)
 
 
-def _NONE1(x):
+def _NONE1(*args):
     pass
 
 
@@ -146,12 +149,117 @@ class Logger(File):
             self.firstcall()
         super().append(s)
 
+    def close(self):
+        pass  # every append() is already written
+
     def as_dict(self):
         d = super().as_dict()
         d.update({'firstcall': repr(self.firstcall)})
         return d
 
 
+class BufferedLogger(Logger):
+    """
+    Logger that doesn't touch the file on append().
+
+    Appended strings go on a queue that a writer thread empties into a file it keeps open,
+    every `interval` seconds or as soon as `max_lines` are waiting, whichever comes first.
+    With fsync=True each batch is also fsync()ed, so it survives a power cut.
+    close() (also called at exit) writes out whatever is left. Appending after close() starts
+    a new writer thread.
+
+    If the file can't be written (i.e. its directory was removed, or the disk is full), the
+    error is printed and kept in `error`, and from then on lines are counted in `dropped`
+    instead of queued. Lines are also dropped while `max_queue` of them are waiting, so a
+    stalled writer can't use up memory.
+    """
+
+    def __init__(self, path, firstcall=None, interval=1.0, max_lines=256, fsync=False, max_queue=100000):
+        super().__init__(path, firstcall)
+        self.interval = interval
+        self.max_lines = max_lines
+        self.fsync = fsync
+        self.max_queue = max_queue
+        self.queue = collections.deque()  # append() and popleft() are thread-safe
+        self.batches = 0
+        self.lines = 0
+        self.dropped = 0
+        self.error = None  # what stopped the writer thread, if anything did
+        self._wake = threading.Event()
+        self._run = False
+        self.thread = None
+
+    def append(self, s):
+        if not self._initialized:
+            self._initialized = True
+            self.firstcall()
+        if self.error is not None or len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        if self.thread is None or not self.thread.is_alive():
+            self.start()
+        self.queue.append(s)
+        if len(self.queue) >= self.max_lines:
+            self._wake.set()
+
+    def start(self):
+        self._run = True
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def loop(self):
+        try:
+            with open(self.path, 'a') as f:
+                while self._run:
+                    self._wake.wait(self.interval)
+                    self._wake.clear()
+                    self.write_batch(f)
+                self.write_batch(f)
+        except Exception as err:
+            self.error = err
+            self.dropped += len(self.queue)
+            self.queue.clear()
+            print(f"Stopped writing {self.path}: {err}. Lines logged from now on are dropped.")
+
+    def write_batch(self, f):
+        n = len(self.queue)
+        if not n:
+            return
+        batch = ''.join(self.queue.popleft() for _ in range(n))
+        try:
+            f.write(batch)
+            f.flush()
+        except Exception:
+            self.dropped += n
+            raise
+        if self.fsync:
+            os.fsync(f.fileno())
+        self.batches += 1
+        self.lines += n
+
+    def close(self, timeout=5):
+        # stop the writer thread after it's written everything queued so far
+        if self.thread is None:
+            return
+        self._run = False
+        self._wake.set()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            # keep it, so append() doesn't start a second writer on the same file; atexit tries again
+            print(f"Timed out waiting for {self.path} to be written.")
+            return
+        atexit.unregister(self.close)
+        self.thread = None
+
+    def as_dict(self):
+        d = super().as_dict()
+        d.update({'interval': self.interval, 'max_lines': self.max_lines, 'fsync': self.fsync,
+                  'batches': self.batches, 'lines': self.lines, 'dropped': self.dropped,
+                  'error': None if self.error is None else str(self.error)})
+        return d
+
+
 class FolderlessProject:
     isproj = False
 
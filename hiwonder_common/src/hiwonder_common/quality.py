@@ -0,0 +1,66 @@
+# trade detection quality for frame rate
+
+import hiwonder_common.statistics_tools as st
+
+
+class QualityController:
+    """
+    Steps detection quality down when frames take too long, and back up when there's room.
+
+    Feed it the time each frame spent working (not waiting for the camera) in nanoseconds.
+    It returns the new quality level when it decides to change, otherwise None.
+    Level 0 is full quality; see LEVELS for what each level turns off.
+
+    After every change it holds for `hold` frames so the average can settle, and it only
+    steps back up once frames fit in `headroom` of the budget, so it doesn't flap.
+    """
+
+    LEVELS = (
+        # (extra pyrDown levels, blur, morphology passes)
+        (0, True, 2),
+        (0, False, 2),
+        (1, True, 2),
+        (1, False, 1),
+        (2, False, 1),
+        (2, False, 0),
+    )
+
+    def __init__(self, target_fps, window=10, headroom=0.7, hold=30):
+        self.target_fps = target_fps
+        self.budget_ns = 1e9 / target_fps
+        self.headroom = headroom
+        self.hold = hold
+        self.level = 0
+        self.changes = 0
+        self.averager = st.Average(window)
+        self._since_change = 0
+
+    @property
+    def settings(self):
+        return self.LEVELS[self.level]
+
+    def __call__(self, work_ns):
+        avg = self.averager(work_ns)
+        self._since_change += 1
+        if self._since_change < self.hold:
+            return None
+        if avg > self.budget_ns and self.level < len(self.LEVELS) - 1:
+            return self.set_level(self.level + 1)
+        if avg < self.budget_ns * self.headroom and self.level > 0:
+            return self.set_level(self.level - 1)
+        return None
+
+    def set_level(self, level):
+        self.level = level
+        self.changes += 1
+        self._since_change = 0
+        self.averager.list = []  # old timings were measured at the old level
+        return level
+
+    def as_config_dict(self):
+        return {
+            'target_fps': self.target_fps,
+            'headroom': self.headroom,
+            'hold': self.hold,
+            'levels': [list(level) for level in self.LEVELS],
+        }
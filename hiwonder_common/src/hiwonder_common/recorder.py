@@ -0,0 +1,108 @@
+# record what the robot saw, off the control loop
+
+import queue
+import pathlib
+import threading
+import numpy as np
+import cv2
+
+
+class VideoRecorder:
+    """
+    Writes frames to a compressed video on a background thread.
+
+    submit() puts the frame on a bounded queue and returns right away. If the writer
+    falls behind and the queue is full, the frame is dropped and counted instead of
+    stalling the control loop.
+
+    Next to the video, an index file gets one row per written frame with its position
+    in the video, its capture.Frame seq (the frame_seq column of io.tsv), and its
+    capture timestamp, so video frames can be joined to io.tsv rows.
+
+    If render is given, frames are drawn on like PreviewWorker does, using render(canvas, info)
+    with the info passed to submit(), and the annotated frame is recorded at full size.
+    Frames must not be modified after they're submitted.
+    """
+
+    def __init__(self, path, fps=30.0, fourcc='MJPG', render=None, maxsize=30):
+        self._run = True
+        self.path = pathlib.Path(path)
+        self.index_path = self.path.with_suffix('.tsv')
+        self.fps = fps
+        self.fourcc = fourcc
+        self.render = render
+        self.queue = queue.Queue(maxsize)
+        self.written = 0
+        self.dropped = 0
+        self.writer = None
+        self.index = None
+        self.canvas = None
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+
+    def submit(self, frame, info=None):
+        # frame is a capture.Frame
+        try:
+            self.queue.put_nowait((frame, info))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def start(self):
+        self.thread.start()
+
+    def loop(self):
+        # keep going until stopped and everything already queued is written
+        while self._run or not self.queue.empty():
+            try:
+                frame, info = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self.write(frame, info)
+        self.close()
+
+    def write(self, frame, info):
+        img = frame.image
+        if self.render is not None:
+            if self.canvas is None or self.canvas.shape != img.shape:
+                self.canvas = np.empty_like(img)
+            np.copyto(self.canvas, img)
+            self.render(self.canvas, info)
+            img = self.canvas
+        if self.writer is None:
+            self.open(img.shape)
+        self.writer.write(img)
+        self.index.write(f"{self.written}\t{frame.seq}\t{frame.t_ns}\n")
+        self.written += 1
+
+    def open(self, shape):
+        h, w = shape[:2]
+        self.writer = cv2.VideoWriter(str(self.path), cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (w, h))
+        if not self.writer.isOpened():
+            raise OSError(f"Couldn't open {self.path} for writing with fourcc {self.fourcc}")
+        self.index = open(self.index_path, 'w')
+        self.index.write("video_frame\tframe_seq\ttime_ns\n")
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+        if self.index is not None:
+            self.index.close()
+
+    def stop(self):
+        self._run = False
+
+    def spin_until_dead(self, timeout=5):
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        if self.thread.is_alive():
+            print("Timed out waiting for recorder thread to die.")
+
+    def as_config_dict(self):
+        return {
+            'path': str(self.path),
+            'index_path': str(self.index_path),
+            'fps': self.fps,
+            'fourcc': self.fourcc,
+            'annotated': self.render is not None,
+        }
@@ -0,0 +1,152 @@
+# fixed-width binary version of io.tsv that can be read back without parsing
+
+import sys
+import json
+import struct
+import pathlib
+import numpy as np
+
+MAGIC = b"HWRUNLOG"
+VERSION = 2  # 2 added int_moves
+MOVE_FIELDS = ('n_moves', 'moves', 'int_moves')  # the rest come from the program's RUNLOG_FIELDS
+ALIGN = 16  # records start at a multiple of this many bytes
+
+
+def _dtype_from_json(descr):
+    return np.dtype([tuple(field[:2]) + tuple(tuple(x) for x in field[2:]) for field in descr])
+
+
+class RunLogWriter:
+    """
+    Writes one fixed-size record per frame: the program's RUNLOG_FIELDS, then n_moves and
+    the frame's last `max_moves` moves as (v, d, w) rows, NaN where there were fewer.
+    n_moves is the real count, so n_moves > max_moves means older moves were left out.
+    int_moves has a bit per (v, d, w) value that was a python int, so the TSV export
+    prints 100 where io.tsv has 100 and 100.0 where it has 100.0.
+
+    The file starts with MAGIC, a little-endian uint32 length, and a JSON header holding the
+    record dtype and the io.tsv column names, padded so the records are aligned.
+    Records are collected in a preallocated array and written `chunk` at a time and on close().
+    columns can be a function, called when the file is created on the first write().
+    """
+
+    def __init__(self, path, fields, columns=None, max_moves=4, chunk=256):
+        self.path = pathlib.Path(path)
+        self.columns = columns
+        self.max_moves = max_moves
+        self.chunk = chunk
+        self.dtype = np.dtype(list(fields) + [
+            ('n_moves', 'u2'), ('moves', 'f8', (max_moves, 3)), ('int_moves', 'u1', (max_moves,))])
+        self.buffer = np.zeros(chunk, self.dtype)
+        self.no_moves = np.full((max_moves, 3), np.nan)
+        self.pending = 0
+        self.written = 0
+        self.f = None
+
+    def open(self):
+        columns = self.columns() if callable(self.columns) else self.columns
+        header = {
+            'version': VERSION,
+            'dtype': self.dtype.descr,
+            'max_moves': self.max_moves,
+            'columns': list(columns) if columns else list(self.dtype.names),
+        }
+        header = json.dumps(header).encode()
+        header += b' ' * (-(len(MAGIC) + 4 + len(header)) % ALIGN)
+        self.f = open(self.path, 'wb')
+        self.f.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    def write(self, row, moves):
+        if self.f is None:
+            self.open()
+        i = self.pending
+        self.buffer[i] = (*row, len(moves), self.no_moves, 0)
+        if moves:
+            moves = moves[-self.max_moves:]
+            self.buffer['moves'][i, :len(moves)] = moves
+            self.buffer['int_moves'][i, :len(moves)] = [
+                sum(1 << k for k, x in enumerate(move) if isinstance(x, int)) for move in moves]
+        self.pending += 1
+        if self.pending == self.chunk:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.f.write(self.buffer[:self.pending].tobytes())
+            self.written += self.pending
+            self.pending = 0
+        if self.f is not None:
+            self.f.flush()
+
+    def close(self):
+        if self.f is None:
+            return
+        self.flush()
+        self.f.close()
+        self.f = None
+
+    def as_config_dict(self):
+        return {'path': str(self.path), 'max_moves': self.max_moves, 'chunk': self.chunk, 'written': self.written}
+
+
+def read_runlog(path):
+    """
+    Returns (records, header). records is a read-only np.memmap of the file, so nothing is
+    parsed or copied until it's used. A partly written last record is left out.
+    """
+    path = pathlib.Path(path)
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a run log.")
+        n, = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(n))
+    if header['version'] > VERSION:
+        raise ValueError(f"{path} is run log version {header['version']}, but only up to {VERSION} is supported.")
+    dtype = _dtype_from_json(header['dtype'])
+    offset = len(MAGIC) + 4 + n
+    count = (path.stat().st_size - offset) // dtype.itemsize
+    if not count:  # np.memmap can't map zero bytes
+        return np.zeros(0, dtype), header
+    return np.memmap(path, dtype, 'r', offset, shape=(count,)), header
+
+
+def last_moves(records):
+    # (n, 3) array of each record's last (v, d, w), NaN where it had no moves
+    n = np.minimum(records['n_moves'], records.dtype['moves'].shape[0]).astype(np.intp)
+    moves = records['moves'][np.arange(len(records)), np.maximum(n - 1, 0)]
+    moves[n == 0] = np.nan
+    return moves
+
+
+def row_fields(records):
+    # names of the columns before the moves
+    return [name for name in records.dtype.names if name not in MOVE_FIELDS]
+
+
+def write_tsv(records, header, f):
+    # the same rows io.tsv would have had, except frames with more than max_moves moves only have their last ones
+    fields = row_fields(records)
+    f.write('\t'.join(header['columns']) + '\n')
+    max_moves = records.dtype['moves'].shape[0]
+    has_ints = 'int_moves' in records.dtype.names  # version 1 files don't
+    for record in records:
+        n = min(record['n_moves'], max_moves)
+        ints = record['int_moves'][:n] if has_ints else [0] * n
+        moves = [tuple(int(x) if bits >> k & 1 else float(x) for k, x in enumerate(move))
+                 for move, bits in zip(record['moves'][:n], ints)]
+        f.write('\t'.join(str(record[name].item()) for name in fields) + f"\t{repr(moves)}\n")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Export a binary run log (io.bin) to TSV.")
+    parser.add_argument("path", type=pathlib.Path)
+    parser.add_argument("out", type=pathlib.Path, nargs='?', help="Defaults to stdout.")
+    args = parser.parse_args()
+
+    records, header = read_runlog(args.path)
+    if args.out:
+        with open(args.out, 'w') as f:
+            write_tsv(records, header, f)
+    else:
+        write_tsv(records, header, sys.stdout)
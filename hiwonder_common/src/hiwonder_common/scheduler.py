@@ -0,0 +1,66 @@
+# run a loop at a fixed rate and keep track of how well it keeps up
+
+import time
+from collections import deque
+import numpy as np
+
+
+class RateScheduler:
+    """
+    Paces a loop to a fixed rate on the monotonic clock.
+
+    Call wait() at the top of every iteration. Deadlines are spaced exactly one period
+    apart from the first one, rather than one period after each wakeup, so oversleeping
+    doesn't make the loop drift slower. If an iteration runs past the next deadline,
+    wait() returns immediately and counts an overrun; if it missed whole periods, those
+    ticks are skipped instead of being run back to back to catch up.
+
+    Lateness (how long after its deadline each iteration actually started) is kept for
+    the last `history` ticks for the jitter percentiles in as_config_dict().
+    """
+
+    def __init__(self, rate_hz, history=10000):
+        self.rate_hz = rate_hz
+        self.period_ns = int(1e9 / rate_hz)
+        self.next_ns = None
+        self.start_ns = None
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0  # deadlines passed without running at all
+        self.max_late_ns = 0
+        self.late_ns = deque(maxlen=history)
+
+    def wait(self):
+        now = time.monotonic_ns()
+        if self.next_ns is None:
+            self.next_ns = self.start_ns = now
+        elif now > self.next_ns:
+            self.overruns += 1
+        else:
+            time.sleep((self.next_ns - now) / 1e9)
+            now = time.monotonic_ns()
+        late = now - self.next_ns
+        self.late_ns.append(late)
+        self.max_late_ns = max(self.max_late_ns, late)
+        self.ticks += 1
+        missed = late // self.period_ns
+        self.skipped += missed
+        self.next_ns += (missed + 1) * self.period_ns
+        return late
+
+    def stats(self):
+        d = {'ticks': self.ticks, 'overruns': self.overruns, 'skipped': self.skipped}
+        if self.ticks > 1:
+            d['achieved_hz'] = (self.ticks - 1) * 1e9 / (time.monotonic_ns() - self.start_ns)
+        if self.late_ns:
+            ms = np.array(self.late_ns) / 1e6
+            d.update({
+                'jitter_p50_ms': float(np.percentile(ms, 50)),
+                'jitter_p90_ms': float(np.percentile(ms, 90)),
+                'jitter_p99_ms': float(np.percentile(ms, 99)),
+                'jitter_max_ms': self.max_late_ns / 1e6,
+            })
+        return d
+
+    def as_config_dict(self):
+        return {'rate_hz': self.rate_hz, **self.stats()}
@@ -0,0 +1,56 @@
+# search near the last detection instead of the whole frame
+
+
+class RoiTracker:
+    """
+    Picks the region of interest for the next frame's detection.
+
+    Once a target is found, the next frame is only searched in its bounding box grown by
+    `pad` times its size on every side (but at least min_pad pixels), so steady-state cost
+    depends on how big the target is rather than on the frame. The whole frame is searched
+    again when the target is lost and every `refresh` frames, so a bigger blob appearing
+    elsewhere still gets noticed. Only call update() for frames detection actually ran on;
+    frames where ChangeGate reused the last detection don't advance the refresh count or the
+    search counters.
+
+    Boxes are in detection coordinates; call reset() if the detection resolution changes.
+    """
+
+    def __init__(self, refresh=30, pad=0.5, min_pad=8):
+        self.refresh = refresh
+        self.pad = pad
+        self.min_pad = min_pad
+        self.box = None  # (x, y, w, h) of the target in the last frame, or None if it was lost
+        self.since_full = 0  # frames since the last whole-frame search
+        self.full_searches = 0
+        self.roi_searches = 0
+
+    def reset(self):
+        self.box = None
+
+    def roi(self, size):
+        # (x, y, w, h) to search in a frame of size (width, height), or None to search all of it
+        if self.box is None or self.since_full >= self.refresh:
+            return None
+        x, y, w, h = self.box
+        W, H = size
+        px = max(int(w * self.pad), self.min_pad)
+        py = max(int(h * self.pad), self.min_pad)
+        x0, y0 = max(int(x) - px, 0), max(int(y) - py, 0)
+        x1, y1 = min(int(x + w) + px, W), min(int(y + h) + py, H)
+        if x1 - x0 >= W and y1 - y0 >= H:
+            return None  # no smaller than the frame anyway
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def update(self, box, roi):
+        # box: the target's bounding box this frame, or None if it wasn't detected. roi: what was searched
+        if roi is None:
+            self.since_full = 0
+            self.full_searches += 1
+        else:
+            self.since_full += 1
+            self.roi_searches += 1
+        self.box = None if box is None else tuple(box)
+
+    def as_config_dict(self):
+        return {'refresh': self.refresh, 'pad': self.pad, 'min_pad': self.min_pad}
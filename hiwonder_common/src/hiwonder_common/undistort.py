@@ -0,0 +1,74 @@
+# fisheye lens correction at whatever resolution it's needed, instead of on every full frame
+
+import numpy as np
+import cv2
+
+
+class Undistorter:
+    """
+    Fisheye undistortion from a HiWonder camera calibration, scaled to any image size.
+
+    K, D and dim are the calibration (camera matrix, distortion coefficients, and the
+    (width, height) it was made at), as in the camera's calibration_param.npz. The corrected
+    view uses the same new camera matrix as Camera.Camera, so images and points come out with
+    the same geometry as the camera's own correction=True frames.
+
+    maps(size) builds cv2.remap tables for images of size (width, height) once and caches them.
+    undistort_points() and distort_points() map pixel coordinates between the raw and corrected
+    views without touching any images.
+    """
+
+    def __init__(self, K, D, dim):
+        self.K = np.asarray(K, np.float64)
+        self.D = np.asarray(D, np.float64).reshape(4, 1)
+        self.dim = tuple(int(v) for v in dim)
+        self.new_K = cv2.fisheye.estimateNewCameraMatrixForUndistortRectify(self.K, self.D, self.dim, np.eye(3))
+        self._maps = {}
+
+    @classmethod
+    def from_param_data(cls, param_data):
+        # param_data: the dict-like contents of calibration_param.npz (dim_array, k_array, d_array)
+        return cls(np.array(param_data['k_array'].tolist()), np.array(param_data['d_array'].tolist()),
+                   tuple(param_data['dim_array']))
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_param_data(np.load(path))
+
+    def scaled(self, size):
+        # (K, new_K) for images of size (width, height)
+        sx, sy = size[0] / self.dim[0], size[1] / self.dim[1]
+        scale = np.array([[sx, 0, sx], [0, sy, sy], [0, 0, 1]])  # scales fx, cx and fy, cy
+        return self.K * scale, self.new_K * scale
+
+    def maps(self, size):
+        # (mapx, mapy) float32 remap tables for images of size (width, height)
+        size = tuple(size)
+        maps = self._maps.get(size)
+        if maps is None:
+            K, new_K = self.scaled(size)
+            maps = cv2.fisheye.initUndistortRectifyMap(K, self.D, np.eye(3), new_K, size, cv2.CV_32FC1)
+            self._maps[size] = maps
+        return maps
+
+    def remap(self, img, dst=None):
+        mapx, mapy = self.maps(img.shape[1::-1])
+        return cv2.remap(img, mapx, mapy, cv2.INTER_LINEAR, dst=dst, borderMode=cv2.BORDER_CONSTANT)
+
+    def undistort_points(self, points, size):
+        # raw pixel coordinates in an image of size (width, height) -> corrected pixel coordinates
+        K, new_K = self.scaled(size)
+        pts = np.asarray(points, np.float64).reshape(-1, 1, 2)
+        out = cv2.fisheye.undistortPoints(pts, K, self.D, R=np.eye(3), P=new_K)
+        return out.reshape(np.shape(points)).astype(np.float32)
+
+    def distort_points(self, points, size):
+        # corrected pixel coordinates -> raw pixel coordinates, i.e. to draw on an uncorrected frame
+        K, new_K = self.scaled(size)
+        pts = np.asarray(points, np.float64).reshape(-1, 1, 2)
+        normalized = (pts - new_K[:2, 2]) / (new_K[0, 0], new_K[1, 1])
+        out = cv2.fisheye.distortPoints(normalized, K, self.D)
+        return out.reshape(np.shape(points)).astype(np.float32)
+
+    def as_config_dict(self):
+        return {'dim': list(self.dim), 'K': self.K.tolist(), 'D': self.D.ravel().tolist()}
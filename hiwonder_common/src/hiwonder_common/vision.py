@@ -0,0 +1,383 @@
+# color blob detection for camera programs
+
+import math
+import operator
+import numpy as np
+import cv2
+
+from hiwonder_common.color_lut import BGRTable
+
+
+def color_contour_detection(
+    frame,
+    threshold: tuple[tuple[int, int, int], tuple[int, int, int]],
+    open_kernel: np.ndarray = None,
+    close_kernel: np.ndarray = None,
+    mask: np.ndarray = None,
+    work: np.ndarray = None,
+):
+    # Image Processing
+    # mask and work are optional single-channel buffers the size of frame.
+    # If given, they're written to instead of allocating new arrays.
+    # The mask we return is whichever one holds the final result.
+    # mask the colors we want
+    lo, hi = (tuple(li) for li in threshold)  # cast to tuple to make cv2 happy
+    mask = cv2.inRange(frame, lo, hi, dst=mask)  # type: ignore
+    mask, _work = clean_mask(mask, open_kernel, close_kernel, work)
+    return sorted_contours(mask)
+
+
+def clean_mask(mask, open_kernel=None, close_kernel=None, work=None):
+    # Perform an opening and closing operation on the mask
+    # https://youtu.be/1owu136z1zI?feature=shared&t=34
+    # ping-pongs between mask and work; returns (result, scratch)
+    if open_kernel is not None:
+        mask, work = cv2.morphologyEx(mask, cv2.MORPH_OPEN, open_kernel, dst=work), mask
+    if close_kernel is not None:
+        mask, work = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, close_kernel, dst=work), mask
+    return mask, work
+
+
+def sorted_contours(mask):
+    # find contours (blobs) in the mask. findContours doesn't modify its input (OpenCV >= 3.2)
+    contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
+    areas = [math.fabs(cv2.contourArea(contour)) for contour in contours]
+    # zip to provide pairs of (contour, area)
+    zipped = zip(contours, areas)
+    # return largest-to-smallest contour
+    return sorted(zipped, key=operator.itemgetter(1), reverse=True)
+
+
+class Blobs:
+    """
+    Blobs found in a mask, biggest first, as parallel NumPy arrays.
+
+    areas: pixel counts, shape (n,)
+    centroids: (x, y), shape (n, 2)
+    boxes: bounding boxes as (x, y, w, h), shape (n, 4)
+
+    Point-level contours aren't traced until contour(i) asks for one. That reads
+    the label image, which belongs to the pipeline and is overwritten on the next
+    frame, so call it before then. Without a label image (i.e. Blobs that came from
+    a worker process) contour() gives the corners of the bounding box.
+    """
+
+    def __init__(self, areas, centroids, boxes, labels=None, ids=None, contours=None):
+        self.areas = areas
+        self.centroids = centroids
+        self.boxes = boxes
+        self.labels = labels  # label image from cv2.connectedComponents*
+        self.ids = ids  # label of each blob in labels
+        self.contours = contours  # already-traced contours, if the backend has them
+        self.origin = (0, 0)  # where labels[0, 0] is, in the same coordinates as boxes
+
+    def __len__(self):
+        return len(self.areas)
+
+    @property
+    def biggest_area(self):
+        return self.areas[0].item() if len(self.areas) else 0  # a python number, so it can go in yaml
+
+    def contour(self, i=0):
+        if self.contours is not None:
+            return self.contours[i]
+        if self.labels is None:
+            x, y, w, h = self.boxes[i]
+            return np.array([[[x, y]], [[x + w, y]], [[x + w, y + h]], [[x, y + h]]], np.int32)
+        # trace just this blob, inside its bounding box
+        x, y, w, h = self.boxes[i]
+        ox, oy = self.origin
+        roi = (self.labels[y - oy:y - oy + h, x - ox:x - ox + w] == self.ids[i]).view(np.uint8)
+        contours = cv2.findContours(roi, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE, offset=(int(x), int(y)))[-2]
+        return max(contours, key=len)
+
+    def shift(self, dx, dy):
+        # move every blob by (dx, dy), i.e. from a region of interest's coordinates to the whole image's
+        if dx or dy:
+            self.centroids = self.centroids + (dx, dy)
+            self.boxes = self.boxes + np.array((dx, dy, 0, 0), self.boxes.dtype)
+            if self.contours is not None:
+                self.contours = [contour + np.array((dx, dy), contour.dtype) for contour in self.contours]
+            self.origin = (self.origin[0] + dx, self.origin[1] + dy)
+        return self
+
+    @classmethod
+    def from_contours(cls, contours):
+        # wrap the output of sorted_contours() so either backend can be used interchangeably
+        if not contours:
+            return cls(np.zeros(0), np.zeros((0, 2)), np.zeros((0, 4), np.int32), contours=[])
+        contours, areas = zip(*contours)
+        boxes = np.array([cv2.boundingRect(contour) for contour in contours], np.int32)
+        centroids = boxes[:, :2] + boxes[:, 2:] / 2  # fallback for degenerate contours
+        for i, contour in enumerate(contours):
+            m = cv2.moments(contour)
+            if m['m00']:
+                centroids[i] = m['m10'] / m['m00'], m['m01'] / m['m00']
+        return cls(np.array(areas), centroids, boxes, contours=list(contours))
+
+
+def find_blobs(mask, k=None, labels=None):
+    # Connected-component blob extraction. Returns the k biggest blobs as Blobs.
+    # Only the k winners are sorted, so a noisy mask with hundreds of specks costs
+    # one labelling pass plus an O(n) partition instead of n contourArea() calls and a sort.
+    # labels is an optional int32 buffer the size of mask.
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(
+        mask, labels=labels, connectivity=8, ltype=cv2.CV_32S)
+    areas = stats[1:, cv2.CC_STAT_AREA]  # label 0 is the background
+    if k is not None and k < len(areas):
+        idx = np.argpartition(areas, len(areas) - k)[-k:]
+    else:
+        idx = np.arange(len(areas))
+    idx = idx[np.argsort(areas[idx])[::-1]]
+    return Blobs(areas[idx], centroids[1:][idx], stats[1:][idx, :4], labels=labels, ids=idx + 1)
+
+
+class ColorTable:
+    """
+    Per-channel lookup tables that threshold up to 8 colors at once.
+
+    Each LAB threshold is a box, so "is this pixel in range for color k" splits into
+    one independent test per channel. Bit k of table[c][v] is set if value v is within
+    color k's range on channel c. Looking up all three channels and ANDing the results
+    gives a bit-packed image where bit k is color k's mask.
+    """
+
+    MAX_COLORS = 8  # bits in a uint8
+
+    def __init__(self, thresholds: dict):
+        if len(thresholds) > self.MAX_COLORS:
+            raise ValueError(f"ColorTable holds at most {self.MAX_COLORS} colors. Got {len(thresholds)}.")
+        self.names = list(thresholds)
+        self.tables = np.zeros((3, 256), np.uint8)
+        for bit, (lo, hi) in enumerate(thresholds.values()):
+            for c in range(3):
+                self.tables[c, lo[c]:hi[c] + 1] |= 1 << bit
+
+    def bits(self, channels, dst, work):
+        # channels: the three planes from cv2.split(). dst and work: single-channel buffers
+        cv2.LUT(channels[0], self.tables[0], dst=dst)
+        for c in (1, 2):
+            cv2.LUT(channels[c], self.tables[c], dst=work)
+            cv2.bitwise_and(dst, work, dst=dst)
+        return dst
+
+    def mask(self, bits, name, dst=None):
+        # pixels in mask are nonzero where bits has this color's bit set
+        return cv2.bitwise_and(bits, (1 << self.names.index(name),), dst=dst)
+
+
+class DetectionPipeline:
+    """
+    Working buffers for blob detection, allocated once and reused for every frame.
+
+    All of the cv2 calls write into these buffers through dst=, so a steady-state frame
+    allocates nothing but the contour list. The buffers are overwritten on the next frame,
+    so copy anything you want to keep.
+
+    Frames are resized to size, then halved pyr_levels times with cv2.pyrDown.
+    Detection runs at the resulting self.size; use to_frame_coords() to map
+    contours back onto the full frame and scale_area() to adjust area thresholds.
+
+    backend picks how blobs() and detect_colors() find blobs in a mask:
+    'components' uses cv2.connectedComponentsWithStats (see find_blobs()),
+    'contours' traces every contour like color_contour_detection().
+
+    If lut_bits is set, thresholds are compiled into a color_lut.BGRTable with that many bits
+    per channel and applied to the BGR frame directly; prepare() then skips the LAB conversion
+    and returns BGR. Thresholds are always given in LAB either way.
+
+    prepare() can be limited to a region of interest, given in detection coordinates. Only that
+    part of the frame is resized, converted, and searched, using the top-left corner of each buffer,
+    and blobs() and detect_colors() shift what they find back to whole-frame detection coordinates.
+
+    If undistort is an undistort.Undistorter, frames are lens-corrected after shrinking, with remap
+    tables made once at detection resolution, so everything found is in corrected coordinates.
+    With a region of interest, the whole frame is still shrunk but only the region is remapped.
+    """
+
+    BACKENDS = ('components', 'contours')
+
+    def __init__(self, size, blur=True, open_kernel=None, close_kernel=None, pyr_levels=0, backend='components',
+                 lut_bits=None, undistort=None):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"backend must be one of {self.BACKENDS}. Got {backend!r}")
+        self.base_size = tuple(size)  # (width, height), same order as cv2.resize
+        self.pyr_levels = pyr_levels
+        self.backend = backend
+        self.lut_bits = lut_bits
+        self.undistort = undistort
+        self.blur = blur
+        self.open_kernel = np.ones((3, 3), np.uint8) if open_kernel is None else open_kernel
+        self.close_kernel = np.ones((3, 3), np.uint8) if close_kernel is None else close_kernel
+        self.morph_passes = 2  # 2: open and close, 1: open only, 0: no morphology
+
+        w, h = self.base_size
+        self.small = np.empty((h, w, 3), np.uint8)
+        self.pyr = []
+        for _ in range(pyr_levels):
+            w, h = (w + 1) // 2, (h + 1) // 2
+            self.pyr.append(np.empty((h, w, 3), np.uint8))
+        self.size = (w, h)  # detection resolution
+
+        self.undistorted = np.empty((h, w, 3), np.uint8) if undistort is not None else None
+        self.blurred = np.empty((h, w, 3), np.uint8)
+        self.lab = np.empty((h, w, 3), np.uint8)
+        self.mask = np.empty((h, w), np.uint8)
+        self.work = np.empty((h, w), np.uint8)
+        self.labels = np.empty((h, w), np.int32)
+        self.color_labels = {}  # one label image per color so every color's Blobs stays valid
+        self.channels = [np.empty((h, w), np.uint8) for _ in range(3)]
+        self.bits = []  # one bit-packed mask per ColorTable, see detect_colors()
+        self.color_tables = {}
+        self.prepared = None  # output of the last prepare()
+        self.roi = None  # (x, y, w, h) region the last prepare() covered, or None for the whole frame
+        self.timer = None  # anything with a lap(stage_name) method, see benchmark.Stopwatch
+
+    def prepare(self, raw, roi=None):
+        # prep a resized, blurred, LAB version of the frame for contour detection
+        # roi: (x, y, w, h) in detection coordinates to prepare only that part of the frame
+        self.roi = roi
+        if roi is not None and self.undistort is None:
+            return self.prepare_roi(raw, roi)
+        src = raw
+        if raw.shape[1::-1] != self.base_size:
+            # INTER_AREA averages when shrinking so small blobs don't alias away
+            src = cv2.resize(raw, self.base_size, dst=self.small, interpolation=cv2.INTER_AREA)
+            self.lap('resize')
+        for buf in self.pyr:
+            src = cv2.pyrDown(src, dst=buf, dstsize=buf.shape[1::-1])
+            self.lap('pyrdown')
+        x, y, w, h = (0, 0) + self.size if roi is None else roi
+        if self.undistort is not None:
+            # the tables hold source coordinates, so a slice of them remaps just that region
+            mapx, mapy = self.undistort.maps(self.size)
+            src = cv2.remap(src, mapx[y:y + h, x:x + w], mapy[y:y + h, x:x + w], cv2.INTER_LINEAR,
+                            dst=self.undistorted[:h, :w], borderMode=cv2.BORDER_CONSTANT)
+            self.lap('undistort')
+        return self.finish_prepare(src, self.blurred[:h, :w], self.lab[:h, :w])
+
+    def prepare_roi(self, raw, roi):
+        # crop the matching part of the raw frame and take it straight to detection resolution.
+        # One INTER_AREA resize stands in for resize + pyrDown; both average the same pixels.
+        x, y, w, h = roi
+        sx = raw.shape[1] / self.size[0]
+        sy = raw.shape[0] / self.size[1]
+        crop = raw[round(y * sy):round((y + h) * sy), round(x * sx):round((x + w) * sx)]
+        src = crop
+        if crop.shape[:2] != (h, w):
+            src = cv2.resize(crop, (w, h), dst=self.small[:h, :w], interpolation=cv2.INTER_AREA)
+            self.lap('resize')
+        return self.finish_prepare(src, self.blurred[:h, :w], self.lab[:h, :w])
+
+    def finish_prepare(self, src, blurred, lab):
+        if self.blur:
+            src = cv2.GaussianBlur(src, (3, 3), 3, dst=blurred)
+            self.lap('blur')
+        if not self.lut_bits:
+            src = cv2.cvtColor(src, cv2.COLOR_BGR2LAB, dst=lab)  # convert to LAB space
+            self.lap('cvtcolor')
+        self.prepared = src
+        return src
+
+    def buffers(self, frame):
+        # (mask, work, labels) views matching frame, which may be a region of interest
+        h, w = frame.shape[:2]
+        return self.mask[:h, :w], self.work[:h, :w], self.labels[:h, :w]
+
+    def to_full(self, blobs):
+        # shift blobs found in the last prepare()'s region of interest to whole-frame coordinates
+        if self.roi is not None:
+            blobs.shift(self.roi[0], self.roi[1])
+        return blobs
+
+    def contours(self, lab, threshold):
+        return color_contour_detection(
+            lab, threshold,
+            *self.kernels,
+            mask=self.mask,
+            work=self.work,
+        )
+
+    def lap(self, stage):
+        if self.timer is not None:
+            self.timer.lap(stage)
+
+    @property
+    def kernels(self):
+        # (open_kernel, close_kernel), leaving out passes that are turned off
+        return (self.open_kernel if self.morph_passes >= 1 else None,
+                self.close_kernel if self.morph_passes >= 2 else None)
+
+    def find_blobs(self, mask, k=1, labels=None):
+        if self.backend == 'contours':
+            return Blobs.from_contours(sorted_contours(mask)[:k])
+        return find_blobs(mask, k, labels=self.labels if labels is None else labels)
+
+    def blobs(self, frame, threshold, k=1):
+        # the k biggest blobs within threshold, as Blobs. frame is the output of prepare()
+        if self.lut_bits:
+            return self.detect_colors(frame, {None: threshold}, k)[None]
+        mask, work, labels = self.buffers(frame)
+        lo, hi = (tuple(li) for li in threshold)
+        mask = cv2.inRange(frame, lo, hi, dst=mask)
+        self.lap('threshold')
+        mask, _work = clean_mask(mask, *self.kernels, work)
+        self.lap('morphology')
+        blobs = self.to_full(self.find_blobs(mask, k, labels))
+        self.lap('blobs')
+        return blobs
+
+    def get_tables(self, thresholds: dict):
+        # compiled ColorTables (or BGRTables), up to 8 colors each, cached by threshold values
+        key = tuple((name, tuple(lo), tuple(hi)) for name, (lo, hi) in thresholds.items())
+        tables = self.color_tables.get(key)
+        if tables is None:
+            items = list(thresholds.items())
+            if self.lut_bits:
+                n = BGRTable.MAX_COLORS
+                tables = [BGRTable(dict(items[i:i + n]), self.lut_bits) for i in range(0, len(items), n)]
+            else:
+                n = ColorTable.MAX_COLORS
+                tables = [ColorTable(dict(items[i:i + n])) for i in range(0, len(items), n)]
+            if len(self.color_tables) >= 8:  # thresholds changed a lot; don't keep stale ones around
+                self.color_tables.clear()
+            self.color_tables[key] = tables
+        while len(self.bits) < len(tables):
+            self.bits.append(np.empty_like(self.mask))
+        return tables
+
+    def detect_colors(self, frame, thresholds: dict, k=1):
+        # Find the biggest k blobs of every color in thresholds, which maps names to (min, max)
+        # Returns {name: Blobs}. All masks come out of one pass over the frame; see ColorTable.
+        tables = self.get_tables(thresholds)
+        mask, work, _labels = self.buffers(frame)
+        h, w = mask.shape
+        channels = [c[:h, :w] for c in self.channels]
+        cv2.split(frame, channels)
+        results = {}
+        for table, bits in zip(tables, self.bits):
+            bits = table.bits(channels, dst=bits[:h, :w], work=work)
+            for name in table.names:
+                color_mask = table.mask(bits, name, dst=mask)
+                self.lap('threshold')
+                color_mask, _work = clean_mask(color_mask, *self.kernels, work)
+                self.lap('morphology')
+                if name not in self.color_labels:
+                    self.color_labels[name] = np.empty_like(self.labels)
+                results[name] = self.to_full(self.find_blobs(color_mask, k, labels=self.color_labels[name][:h, :w]))
+                self.lap('blobs')
+        return results
+
+    def scale_area(self, area, reference_size):
+        # convert an area in pixels at reference_size to pixels at detection resolution
+        rw, rh = reference_size
+        w, h = self.size
+        return area * (w * h) / (rw * rh)
+
+    def to_frame_coords(self, points, frame_shape):
+        # map points or contours found at detection resolution onto a frame of frame_shape
+        sx = frame_shape[1] / self.size[0]
+        sy = frame_shape[0] / self.size[1]
+        if sx == sy == 1:
+            return points
+        return (points * np.array((sx, sy), np.float32)).astype(np.float32)
@@ -0,0 +1,135 @@
+# run blob detection in worker processes, with frames passed through shared memory
+
+import time
+import queue
+import signal
+import multiprocessing as mp
+from collections import namedtuple
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+from hiwonder_common.vision import DetectionPipeline, Blobs
+
+
+# job: submission order. slot: ring slot the frame was in. blobs: vision.Blobs without a label image
+Result = namedtuple('Result', ['job', 'slot', 'blobs', 'work_ns'])
+WORKER_SIGNALS = {signal.SIGINT, signal.SIGTERM, signal.SIGTSTP, signal.SIGCONT}
+
+
+def _worker(frames, pipeline_kwargs, tasks, results):
+    # frames is the shared ring, inherited through fork rather than pickled
+    # the parent stops us. Never run the Program's inherited signal handlers in here;
+    # they're blocked until reset (see DetectionPool.__init__)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for sig in (signal.SIGTERM, signal.SIGTSTP, signal.SIGCONT):
+        signal.signal(sig, signal.SIG_DFL)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, WORKER_SIGNALS)
+    pipeline = DetectionPipeline(**pipeline_kwargs)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job, slot, threshold, k = task
+        t0 = time.perf_counter_ns()
+        try:
+            blobs = pipeline.blobs(pipeline.prepare(frames[slot]), threshold, k)
+            blobs = Blobs(blobs.areas, blobs.centroids, blobs.boxes)  # small enough to pickle
+        except Exception as err:
+            # still answer, or get() would wait on this job forever
+            print(f"Detection worker failed on job {job}: {err}")
+            blobs = Blobs(np.zeros(0), np.zeros((0, 2)), np.zeros((0, 4), np.int32))
+        results.put(Result(job, slot, blobs, time.perf_counter_ns() - t0))
+
+
+class DetectionPool:
+    """
+    Blob detection spread over worker processes.
+
+    Frames are copied into a ring of slots in one multiprocessing.shared_memory block, and
+    only the slot number and threshold go through the task queue. Each worker has its own
+    DetectionPipeline built from pipeline_kwargs. Results come back as small Blobs records
+    and get() hands them out in submission order along with the frame they came from,
+    so several frames can be in flight while control consumes results one at a time.
+
+    Workers are forked, so this only works where fork is available (i.e. Linux).
+    """
+
+    def __init__(self, n_workers, frame_shape, pipeline_kwargs, n_slots=None):
+        ctx = mp.get_context('fork')
+        self.n_workers = n_workers
+        self.n_slots = n_workers + 1 if n_slots is None else n_slots
+        self.frame_shape = tuple(frame_shape)
+        size = int(np.prod(self.frame_shape)) * self.n_slots
+        self.shm = SharedMemory(create=True, size=size)
+        self.frames = np.ndarray((self.n_slots,) + self.frame_shape, np.uint8, buffer=self.shm.buf)
+
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.free = list(range(self.n_slots))  # slots not in use by a worker
+        self.in_flight = {}  # job -> capture.Frame
+        self.done = {}  # job -> Result that came back ahead of an earlier job
+        self.next_job = 0  # job number for the next submit()
+        self.next_out = 0  # job number get() hands out next
+
+        self.processes = [
+            ctx.Process(target=_worker, args=(self.frames, pipeline_kwargs, self.tasks, self.results), daemon=True)
+            for _ in range(n_workers)
+        ]
+        # forked children inherit the parent's handlers, so hold signals until they've replaced them
+        blocked = signal.pthread_sigmask(signal.SIG_BLOCK, WORKER_SIGNALS)
+        try:
+            for p in self.processes:
+                p.start()
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, blocked)
+
+    def __len__(self):
+        return len(self.in_flight)
+
+    @property
+    def can_submit(self):
+        return bool(self.free)
+
+    def submit(self, frame, threshold, k=1):
+        # frame is a capture.Frame. Returns False if every slot is busy
+        if not self.free:
+            return False
+        slot = self.free.pop()
+        np.copyto(self.frames[slot], frame.image)
+        self.in_flight[self.next_job] = frame
+        self.tasks.put((self.next_job, slot, threshold, k))
+        self.next_job += 1
+        return True
+
+    def get(self, timeout=None):
+        # (frame, Result) for the oldest job, or None if it isn't done before timeout
+        while self.next_out not in self.done:
+            if not self.in_flight:
+                return None
+            try:
+                result = self.results.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            self.free.append(result.slot)
+            self.done[result.job] = result
+        result = self.done.pop(self.next_out)
+        frame = self.in_flight.pop(self.next_out)
+        self.next_out += 1
+        return frame, result
+
+    def close(self, timeout=1):
+        # safe to call again; Program.stop() can run more than once
+        if self.frames is None:
+            return
+        for _ in self.processes:
+            self.tasks.put(None)
+        for p in self.processes:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self.frames = None  # release the view before closing the shared memory under it
+        self.shm.close()
+        self.shm.unlink()
+
+    def as_config_dict(self):
+        return {'n_workers': self.n_workers, 'n_slots': self.n_slots}